@@ -28,10 +28,21 @@ from qtpy import QtCore
 from qtpy import QtWidgets
 from qtpy import uic
 
-from core.module import Connector
+from core.module import Connector, ConfigOption
 from gui.colordefs import QudiPalettePale as palette
 from gui.guibase import GUIBase
 
+try:
+    import OpenGL
+    _has_opengl = True
+except ImportError:
+    _has_opengl = False
+
+# pens and brush of the trace are created once and shared
+_PEN = pg.mkPen(palette.c4, style=QtCore.Qt.SolidLine, width=1)
+_SYMBOL_PEN = pg.mkPen(palette.c4)
+_BRUSH = pg.mkBrush(palette.c4)
+
 
 class AutocorrelationMainWindow(QtWidgets.QMainWindow):
 
@@ -45,8 +56,24 @@ class AutocorrelationMainWindow(QtWidgets.QMainWindow):
         # Load it
         super().__init__(**kwargs)
         uic.loadUi(ui_file, self)
+
+        # the mouse wheel only changes spin boxes that already have the focus
+        for spinbox in (self.count_length_SpinBox,
+                        self.count_freq_SpinBox,
+                        self.count_refreshtime_SpinBox):
+            spinbox.setFocusPolicy(QtCore.Qt.StrongFocus)
+            spinbox.installEventFilter(self)
         self.show()
 
+    def eventFilter(self, obj, event):
+        """ Drop wheel events on spin boxes without focus.
+        """
+        if (event.type() == QtCore.QEvent.Wheel
+                and isinstance(obj, QtWidgets.QAbstractSpinBox)
+                and not obj.hasFocus()):
+            return True
+        return super().eventFilter(obj, event)
+
 
 class AutocorrelationGui(GUIBase):
 
@@ -62,6 +89,12 @@ class AutocorrelationGui(GUIBase):
     autocorrelation1 = Connector(interface='AutocorrelationLogic')
     savelogic = Connector(interface='SaveLogic')
 
+    # traces with this many bins or more are drawn without symbols
+    _symbol_threshold = 500
+
+    # draw the trace with OpenGL, needs the optional PyOpenGL package
+    _use_opengl = ConfigOption('use_opengl', False)
+
     sigStartCounter = QtCore.Signal()
     sigStopCounter = QtCore.Signal()
     sigResumeCounter = QtCore.Signal()
@@ -98,20 +131,37 @@ class AutocorrelationGui(GUIBase):
         self._pw = self._mw.autocorrelation_trace_PlotWidget
         self._pw.setLabel('left', 'Counts', units='')
         self._pw.setLabel('bottom', 'Delay', units='s')
+        if self._use_opengl:
+            if _has_opengl:
+                self._pw.useOpenGL(True)
+            else:
+                self.log.warning('use_opengl is set, but PyOpenGL is not '
+                                 'installed. Using the default painter.')
         self.curves = []
         self.curves.append(
                     pg.PlotDataItem(
-                        pen=pg.mkPen(palette.c4, style=QtCore.Qt.SolidLine, width= 1),
-                        symbol='s',
-                        symbolPen=palette.c4,
-                        symbolBrush=palette.c4,
-                        symbolSize=5))
+                        pen=_PEN,
+                        symbolPen=_SYMBOL_PEN,
+                        symbolBrush=_BRUSH,
+                        symbolSize=5,
+                        antialias=False))
+        # only draw what is visible and reduce long traces to their peaks
+        self.curves[0].setDownsampling(auto=True, method='peak')
+        self.curves[0].setClipToView(True)
+        # pan and zoom reuse the rendered curve until new data arrives
+        self.curves[0].curve.setCacheMode(QtWidgets.QGraphicsItem.DeviceCoordinateCache)
+        self._symbols_shown = False
 
         self._pw.addItem(self.curves[0])
-        # setting the x axis length correctly
-        self._pw.setXRange(
-            -1*((self._correlation_logic.get_count_length()/2)*self._correlation_logic.get_bin_width()/(1e12)),
-            (self._correlation_logic.get_count_length() / 2) * self._correlation_logic.get_bin_width() / (1e12))
+        # range changes are deferred and merged, spin box edits can fire
+        # count length and bin width updates in quick succession
+        self._range_timer = QtCore.QTimer()
+        self._range_timer.setSingleShot(True)
+        self._range_timer.setInterval(50)
+        self._range_timer.timeout.connect(self._apply_xrange)
+        # setting the x axis length correctly and caching the delay axis
+        self._axis_params = None
+        self._recompute_xvals()
 
         #####################
         # Setting default parameters for
@@ -140,17 +190,29 @@ class AutocorrelationGui(GUIBase):
         #####################
         # connect signals from logic to gui
         self._correlation_logic.sigCorrelationStatusChanged.connect(self.update_correlation_status_Action)
-        self._correlation_logic.sigCorrelationUpdated.connect(self.updateData)
+        # limit plot refreshes to 30 Hz, bursts of updates are merged
+        self._update_proxy = pg.SignalProxy(
+            self._correlation_logic.sigCorrelationUpdated,
+            rateLimit=30,
+            slot=self.updateData
+            )
         self._correlation_logic.sigCountLengthChanged.connect(self.update_count_length_SpinBox)
         self._correlation_logic.sigCountingBinWidthChanged.connect(self.update_count_bin_width_SpinBox)
+        self._correlation_logic.sigCountLengthChanged.connect(self._recompute_xvals)
+        self._correlation_logic.sigCountingBinWidthChanged.connect(self._recompute_xvals)
         self._correlation_logic.sigCountingRefreshTimeChanged.connect(self.update_refresh_time_SpinBox)
 
         #####################
         # connect signals from gui to gui and logic:
         # logic:
-        self.sigStartCounter.connect(self._correlation_logic.start_correlation)
-        self.sigStopCounter.connect(self._correlation_logic.stop_correlation)
-        self.sigResumeCounter.connect(self._correlation_logic.continue_correlation)
+        # the logic polls the hardware in its own thread, queued connections
+        # make sure the GUI thread never waits for it
+        self.sigStartCounter.connect(
+            self._correlation_logic.start_correlation, QtCore.Qt.QueuedConnection)
+        self.sigStopCounter.connect(
+            self._correlation_logic.stop_correlation, QtCore.Qt.QueuedConnection)
+        self.sigResumeCounter.connect(
+            self._correlation_logic.continue_correlation, QtCore.Qt.QueuedConnection)
         # gui:
         self.sigResumeActionChanged.connect(self.change_resume_state)
         self.sigStopActionChanged.connect(self.change_stop_state)
@@ -170,6 +232,8 @@ class AutocorrelationGui(GUIBase):
         # FIXME: !
         """ Deactivate the module
         """
+        self._range_timer.stop()
+        self._range_timer.timeout.disconnect()
         # disconnect signals from main window
         self._mw.start_counter_Action.triggered.disconnect()
         self._mw.count_length_SpinBox.valueChanged.disconnect()
@@ -185,7 +249,9 @@ class AutocorrelationGui(GUIBase):
         # disconnect signals from logic
         self._correlation_logic.sigCorrelationStatusChanged.disconnect()
         self._correlation_logic.sigCorrelationDataNext.disconnect()
-        self._correlation_logic.sigCorrelationUpdated.disconnect()
+        # also drops a refresh still pending in the proxy
+        self._update_proxy.disconnect()
+        self._update_proxy = None
         self._correlation_logic.sigCountLengthChanged.disconnect()
         self._correlation_logic.sigCountingBinWidthChanged.disconnect()
         self._correlation_logic.sigCountingRefreshTimeChanged.disconnect()
@@ -193,17 +259,49 @@ class AutocorrelationGui(GUIBase):
         self._mw.close()
         return
 
-    def updateData(self):
+    def updateData(self, *args):
         """ The function that grabs the data and sends it to the plot.
         """
         if self._correlation_logic.module_state() == 'locked':
-            x_vals = (
-                np.arange(-1 * ((self._correlation_logic.get_count_length() / 2) * self._correlation_logic.get_bin_width() / (1e12)),
-                         (self._correlation_logic.get_count_length()/2)*self._correlation_logic.get_bin_width()/(1e12),
-                          self._correlation_logic.get_bin_width()/(1e12))
-            )
-            self.curves[0].setData(y=self._correlation_logic.rawdata, x= x_vals)
+            snapshot = self._correlation_logic.get_snapshot()
+            # after a count_length change the axis is rebuilt at once, while the
+            # logic still delivers the old trace until its restart is handled
+            if snapshot.size != self._x_vals.size:
+                return
+            self.curves[0].setData(y=snapshot, x=self._x_vals)
+
+        return
+
+    def _recompute_xvals(self, *args):
+        """ Rebuild the cached delay axis and the plot range.
 
+        Only called on activation and when count_length or bin_width change,
+        so updateData does not have to query the logic on every refresh.
+        """
+        axis_params = self._correlation_logic.get_axis_params()
+        # both parameter signals fire for a single change, and rejected
+        # values are re-emitted unchanged
+        if axis_params == self._axis_params:
+            return
+        self._axis_params = axis_params
+        half_span, step, count_length = axis_params
+        # linspace guarantees one x value per bin, arange with a float step
+        # can be off by one due to rounding
+        self._x_vals = np.linspace(-half_span, half_span, num=count_length,
+                                   endpoint=False, dtype=np.float32)
+        self._half_span = half_span
+        # symbols are only affordable for short traces
+        show_symbols = count_length < self._symbol_threshold
+        if show_symbols != self._symbols_shown:
+            self.curves[0].setSymbol('s' if show_symbols else None)
+            self._symbols_shown = show_symbols
+        self._range_timer.start()
+        return
+
+    def _apply_xrange(self):
+        """ Set the plot range to the current delay span in a single call.
+        """
+        self._pw.setXRange(-self._half_span, self._half_span)
         return
 
     def start_clicked(self):
@@ -241,18 +339,12 @@ class AutocorrelationGui(GUIBase):
         """ Handling the change of the count_length and sending it to the measurement.
         """
         self._correlation_logic.set_count_length(self._mw.count_length_SpinBox.value())
-        self._pw.setXRange(
-            -1 * ((self._correlation_logic.get_count_length() / 2) * self._correlation_logic.get_bin_width() / (1e12)),
-            (self._correlation_logic.get_count_length() / 2) * self._correlation_logic.get_bin_width() / (1e12))
         return self._mw.count_length_SpinBox.value()
 
     def count_frequency_changed(self):
         """ Handling the change of the count_frequency and sending it to the measurement.
         """
         self._correlation_logic.set_bin_width(self._mw.count_freq_SpinBox.value())
-        self._pw.setXRange(
-            -1 * ((self._correlation_logic.get_count_length() / 2) * self._correlation_logic.get_bin_width() / (1e12)),
-            (self._correlation_logic.get_count_length() / 2) * self._correlation_logic.get_bin_width() / (1e12))
         return self._mw.count_freq_SpinBox.value()
 
     def count_refreshtime_changed(self):
@@ -319,9 +411,6 @@ class AutocorrelationGui(GUIBase):
         """
         self._mw.count_freq_SpinBox.blockSignals(True)
         self._mw.count_freq_SpinBox.setValue(count_freq)
-        self._pw.setXRange(
-            -1 * (((self._correlation_logic.get_count_length() / 2) * self._correlation_logic.get_bin_width()) / (1e12)),
-            (self._correlation_logic.get_count_length() / 2) * self._correlation_logic.get_bin_width() / (1e12))
         self._mw.count_freq_SpinBox.blockSignals(False)
         return count_freq
 
@@ -341,9 +430,6 @@ class AutocorrelationGui(GUIBase):
         """
         self._mw.count_length_SpinBox.blockSignals(True)
         self._mw.count_length_SpinBox.setValue(count_length)
-        self._pw.setXRange(
-            -1 * ((self._correlation_logic.get_count_length() / 2) * self._correlation_logic.get_bin_width() / (1e12)),
-            (self._correlation_logic.get_count_length() / 2) * self._correlation_logic.get_bin_width() / (1e12))
         self._mw.count_length_SpinBox.blockSignals(False)
         return count_length
 
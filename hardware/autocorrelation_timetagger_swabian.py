@@ -24,6 +24,7 @@ import TimeTagger as tt
 import numpy as np
 
 from core.module import Base, ConfigOption
+from core.util.mutex import Mutex
 from interface.autocorrelation_interface import AutocorrelationConstraints
 from interface.autocorrelation_interface import AutocorrelationInterface
 
@@ -45,16 +46,24 @@ class AutocorrelationTimetagger(Base, AutocorrelationInterface):
         self._tagger = tt.createTimeTagger()
         self._tagger.reset()
         self.correlation = None
+        # sized by get_normalized_data_trace on first use
+        self._norm_buf = np.empty(0, dtype=np.float32)
 
+        # statusvar is the only run state, guarded by threadlock
+        self.threadlock = Mutex()
         self.statusvar = 0
 
     def on_deactivate(self):
         """ Deactivate the FPGA.
         """
-        if self.getState() == 'locked':
-            self.correlation.stop()
-        self.correlation.clear()
-        self.correlation = None
+        with self.threadlock:
+            if self.correlation is None:
+                return
+            if self.statusvar in (2, 3):
+                self.correlation.stop()
+            self.correlation.clear()
+            self.correlation = None
+            self.statusvar = 0
 
     def get_constraints(self):
 
@@ -128,19 +137,19 @@ class AutocorrelationTimetagger(Base, AutocorrelationInterface):
 
     def start_measure(self):
         """ Start the fast counter. """
-        if self.getState() != 'locked':
-            self.lock()
-            self.correlation.clear()
-            self.correlation.start()
-            self.statusvar = 2
+        with self.threadlock:
+            if self.statusvar not in (2, 3):
+                self.correlation.clear()
+                self.correlation.start()
+                self.statusvar = 2
         return 0
 
     def stop_measure(self):
         """ Stop the fast counter. """
-        if self.getState() == 'locked':
-            self.correlation.stop()
-            self.unlock()
-        self.statusvar = 1
+        with self.threadlock:
+            if self.statusvar in (2, 3):
+                self.correlation.stop()
+            self.statusvar = 1
         return 0
 
     def pause_measure(self):
@@ -148,9 +157,10 @@ class AutocorrelationTimetagger(Base, AutocorrelationInterface):
 
         Fast counter must be initially in the run state to make it pause.
         """
-        if self.getState() == 'locked':
-            self.correlation.stop()
-            self.statusvar = 3
+        with self.threadlock:
+            if self.statusvar in (2, 3):
+                self.correlation.stop()
+                self.statusvar = 3
         return 0
 
     def continue_measure(self):
@@ -158,9 +168,10 @@ class AutocorrelationTimetagger(Base, AutocorrelationInterface):
 
         If fast counter is in pause state, then fast counter will be continued.
         """
-        if self.getState() == 'locked':
-            self.correlation.start()
-            self.statusvar = 2
+        with self.threadlock:
+            if self.statusvar in (2, 3):
+                self.correlation.start()
+                self.statusvar = 2
         return 0
 
     def get_bin_width(self):
@@ -180,22 +191,30 @@ class AutocorrelationTimetagger(Base, AutocorrelationInterface):
     def get_data_trace(self):
         """
 
-        @return numpy.array: onedimensional array of dtype = int64.
+        @return numpy.array: onedimensional array of dtype = int32.
                              Size of array is determined by 2*count_length+1
         """
-        correlation_data = np.array(self.correlation.getData(), dtype='int32')
+        # getData already returns a fresh int32 array, asarray avoids a
+        # second copy and only converts if the dtype differs
+        correlation_data = np.asarray(self.correlation.getData(), dtype=np.int32)
 
         return correlation_data
 
     def get_normalized_data_trace(self):
         """
 
-        @return numpy.array: onedimensional array of dtype = int64 normalized
+        @return numpy.array: onedimensional array of dtype = float32 normalized
                              according to
                              https://www.physi.uni-heidelberg.de/~schmiedm/seminar/QIPC2002/SinglePhotonSource/SolidStateSingPhotSource_PRL85(2000).pdf
                              Size of array is determined by 2*count_length+1
+                             The buffer is reused and overwritten by the
+                             next call.
         """
-        return np.array(self.correlation.getDataNormalized(), dtype='int32')
+        normalized_data = self.correlation.getDataNormalized()
+        if self._norm_buf.shape != np.shape(normalized_data):
+            self._norm_buf = np.empty(np.shape(normalized_data), dtype=np.float32)
+        np.copyto(self._norm_buf, normalized_data, casting='unsafe')
+        return self._norm_buf
 
 class AutocorrelationDummy(Base, AutocorrelationInterface):
     """
@@ -212,6 +231,12 @@ class AutocorrelationDummy(Base, AutocorrelationInterface):
 
         self._count_length = int(10)
         self._bin_width = 1  # bin width in ps
+        # a private generator avoids the global RandomState, the PCG64
+        # Generator is only available with numpy >= 1.17
+        if hasattr(np.random, 'default_rng'):
+            self._randint = np.random.default_rng().integers
+        else:
+            self._randint = np.random.RandomState().randint
 
 
     def on_deactivate(self):
@@ -312,12 +337,10 @@ class AutocorrelationDummy(Base, AutocorrelationInterface):
     def get_data_trace(self):
         """
 
-        @return numpy.array: onedimensional array of dtype = int64.
+        @return numpy.array: onedimensional array of dtype = int32.
                              Size of array is determined by 2*count_length+1
         """
-
-
-        correlation_data = np.random.randint(0, 100, self._count_length, dtype='int32')
+        correlation_data = self._randint(0, 100, self._count_length, dtype=np.int32)
         return correlation_data
 
     def get_normalized_data_trace(self):
@@ -44,6 +44,11 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
     _modtype = 'hardware'
     _ip_address = ConfigOption('ip_address', missing='error')
     _ip_timeout = ConfigOption('ip_timeout', missing='error')
+    # send the list frequencies as IEEE 488.2 binary block instead of ASCII
+    _binary_list_transfer = ConfigOption('binary_list_transfer', False)
+
+    # values written less than this many seconds ago are not read back
+    _READBACK_TTL = 0.1
 
     def on_activate(self):
         """ Initialisation performed during activation of the module.
@@ -55,17 +60,37 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
             self._ip_connection = self.rm.open_resource(
                 self._ip_address,
                 timeout=self._ip_timeout*1000)
-        except:
+        except visa.VisaIOError as exc:
             self.log.error('This is Anapico: could not connect to IP '
-                      'address >>{}<<.'.format(self._ip_address))
+                      'address >>{}<<: {}'.format(self._ip_address, exc))
             raise
+        if not self._ip_address.upper().endswith('SOCKET'):
+            self.log.warning('Anapico is connected via >>{}<<. A raw socket '
+                             'resource like TCPIP::<host>::5025::SOCKET has a '
+                             'much lower latency per command than VXI-11.'
+                             ''.format(self._ip_address))
+        else:
+            # do not let Nagle's algorithm hold back the short SCPI commands
+            try:
+                self._ip_connection.set_visa_attribute(
+                    visa.constants.VI_ATTR_TCPIP_NODELAY, visa.constants.VI_TRUE)
+            except (visa.VisaIOError, NotImplementedError):
+                self.log.warning('Anapico: could not disable Nagle\'s algorithm '
+                                 'on the socket connection.')
         # native command mode, some things are missing in SCPI mode
         #self._ip_connection.write('SYST:LANG \"NATIVE\"')
+        # terminations are required for SOCKET resources, commands carry no ';'
+        self._ip_connection.write_termination = '\n'
         self._ip_connection.read_termination = '\n'
-        self.model = self._ip_connection.query('*IDN?;').split(',')[1]
+        self.model = self._ip_connection.query('*IDN?').split(',')[1]
         self.log.info('Anapico {} initialised and connected to hardware.'
                 ''.format(self.model))
         self._ip_connection.write(':FREQ:MODE CW')
+        # mode and output state are tracked locally from here on
+        self.refresh_status()
+        # delay and dwell list payloads only depend on the list length
+        self._del_dwell_cache = {}
+        self._clear_readback_cache()
 
     def on_deactivate(self):
         """ Deinitialisation performed during deactivation of the module.
@@ -73,6 +98,23 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
         self._ip_connection.close()
         self.rm.close()
 
+    def _clear_readback_cache(self):
+        """ Forget the last written CW frequency and power, so the next read queries the device.
+        """
+        # last written values as (value, time.monotonic())
+        self._freq_cache = (None, float('-inf'))
+        self._power_cache = (None, float('-inf'))
+
+    def _write_many(self, *commands):
+        """ Send several SCPI commands chained in a single write.
+
+        Every command should start with ':' or '*', otherwise the instrument
+        resolves it relative to the preceding command.
+
+        @param str commands: SCPI commands without terminating ';'
+        """
+        self._ip_connection.write(';'.join(commands))
+
     def get_limits(self):
         """ Right now, this is for APSIN6000 only."""
         limits = MicrowaveLimits()
@@ -107,31 +149,32 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
             else:
                 self.off()
 
+        return self._switch_output('cw', True)
 
 
-        if current_mode != 'cw':
-            self._ip_connection.write(':FREQ:MODE CW')
-            self._ip_connection.write('*WAI')
-
-        self._ip_connection.write('OUTP:STAT ON')
-        self._ip_connection.write('*WAI')
-
-        dummy, is_running = self.get_status()
-        while not is_running:
-            time.sleep(0.2)
-            dummy, is_running = self.get_status()
-        return 0
-
-
-    def get_status(self):
+    def get_status(self, force=False):
         """
         Gets the current status of the MW source, i.e. the mode (cw, list or sweep) and
         the output state (stopped, running)
 
+        The status is tracked locally after every command changing it. Use
+        force=True if the device may have been changed from the front panel.
+
+        @param bool force: query the device instead of using the tracked status
+
         @return str, bool: mode ['cw', 'list', 'sweep'], is_running [True, False]
         """
+        if force:
+            return self.refresh_status()
+        return self._mode, self._is_running
+
+    def refresh_status(self):
+        """ Reads mode and output state from the device and updates the
+        locally tracked status.
 
-        is_running = bool(int(float(self._ip_connection.query(':OUTP:STAT?'))))
+        @return str, bool: mode ['cw', 'list', 'sweep'], is_running [True, False]
+        """
+        is_running = self._get_output_state()
         mode = self._ip_connection.query(':FREQ:MODE?').strip('\n').lower()
         if mode == 'fix':
          #   self._ip_connection.write(':FREQ:MODE CW')
@@ -139,28 +182,69 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
         if mode == 'swe':
             mode = 'sweep'
 
+        self._mode = mode
+        self._is_running = is_running
         return mode, is_running
 
+    def _get_output_state(self):
+        """ Queries only the output state of the device.
+
+        @return bool: True if the output is on
+        """
+        return bool(int(float(self._ip_connection.query(':OUTP:STAT?'))))
+
+    def _wait_for_output_state(self, state):
+        """ Polls the output state until it matches, with a short exponential
+        backoff starting at 1 ms. Gives up after the configured ip_timeout.
+
+        @param bool state: expected output state
+
+        @return bool: True if the state was reached in time
+        """
+        get_output_state = self._get_output_state
+        monotonic = time.monotonic
+        deadline = monotonic() + self._ip_timeout
+        delay = 0.001
+        while get_output_state() != state:
+            if monotonic() > deadline:
+                self.log.error('Anapico output did not switch {0} within {1} s.'
+                               ''.format('on' if state else 'off', self._ip_timeout))
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, 0.02)
+        return True
+
     def off(self):
         """ Switches off any microwave output.
 
+        The OFF command is always sent, independent of the tracked status, so
+        the output cannot stay on if the tracked status is out of date.
+
         @return int: error code (0:OK, -1:error)
         """
         mode, is_running = self.get_status()
+        # leaving list mode resets the list position
+        return self._switch_output('cw' if mode == 'list' else mode, False)
 
+    def _switch_output(self, mode, state):
+        """ Set frequency mode and output state and wait until the output follows.
 
-        if not is_running:
-            return 0
-
-        if mode == 'list':
-            self._ip_connection.write(':FREQ:MODE CW')
-            self._ip_connection.write('*WAI')
-
-        self._ip_connection.write(':OUTP OFF')
-        self._ip_connection.write('*WAI')
-        while int(float(self._ip_connection.query('OUTP:STAT?'))) != 0:
-            time.sleep(0.2)
+        @param str mode: frequency mode ['cw', 'list', 'sweep'], only sent if it changes
+        @param bool state: True to switch the output on, False to switch it off
 
+        @return int: error code (0:OK, -1:error)
+        """
+        commands = []
+        if mode != self._mode:
+            commands.append(':FREQ:MODE {0}'.format(mode.upper()))
+        commands += [':OUTP:STAT {0}'.format('ON' if state else 'OFF'), '*WAI']
+        self._write_many(*commands)
+        if not self._wait_for_output_state(state):
+            # the command went out, so resync the tracked status with the device
+            self.refresh_status()
+            return -1
+        self._mode = mode
+        self._is_running = state
         return 0
 
     def get_power(self):
@@ -168,7 +252,10 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
 
         @return float: the power set at the device in dBm
         """
-        return float(self._ip_connection.ask(':POW?;'))
+        power, timestamp = self._power_cache
+        if time.monotonic() - timestamp < self._READBACK_TTL:
+            return power
+        return self._ip_connection.query_ascii_values(':POW?')[0]
 
     def set_power(self, power=None):
         """ Sets the microwave output power.
@@ -178,7 +265,8 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
         @return int: error code (0:OK, -1:error)
         """
         if power is not None:
-            self._ip_connection.write(':POW {0:f};'.format(power))
+            self._ip_connection.write_ascii_values(':POW ', [power], converter='f')
+            self._power_cache = (power, time.monotonic())
             return 0
         else:
             return -1
@@ -188,7 +276,26 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
 
         @return float: frequency (in Hz), which is currently set for this device
         """
-        return float(self._ip_connection.ask(':FREQ?;'))
+        freq, timestamp = self._freq_cache
+        if time.monotonic() - timestamp < self._READBACK_TTL:
+            return freq
+        return self._ip_connection.query_ascii_values(':FREQ?')[0]
+
+    def _get_frequency_and_power(self):
+        """ Reads frequency and power back with a single compound query.
+
+        Values written within the last _READBACK_TTL seconds are returned
+        without querying the device.
+
+        @return float, float: frequency in Hz, power in dBm
+        """
+        now = time.monotonic()
+        if (now - self._freq_cache[1] < self._READBACK_TTL
+                and now - self._power_cache[1] < self._READBACK_TTL):
+            return self._freq_cache[0], self._power_cache[0]
+        freq, power = self._ip_connection.query_ascii_values(':FREQ?;:POW?',
+                                                             separator=';')
+        return freq, power
 
     def set_frequency(self, freq=None):
         """ Sets the frequency of the microwave output.
@@ -198,7 +305,8 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
         @return int: error code (0:OK, -1:error)
         """
         if freq is not None:
-            self._ip_connection.write(':FREQ:CW {0:f};'.format(freq))
+            self._ip_connection.write_ascii_values(':FREQ:CW ', [freq], converter='f')
+            self._freq_cache = (freq, time.monotonic())
             return 0
         else:
             return -1
@@ -206,13 +314,11 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
     def set_cw(self, frequency=None, power=None):
         """ Sets the MW mode to cw and additionally frequency and power
 
-        @param float freq: frequency to set in Hz
+        @param float frequency: frequency to set in Hz
         @param float power: power to set in dBm
-        @param bool useinterleave: If this mode exists you can choose it.
-
-        @return int: error code (0:OK, -1:error)
 
-        Interleave option is used for arbitrary waveform generator devices.
+        @return float, float, str: current frequency in Hz, current power in dBm,
+                                   current mode
         """
 
         mode, is_running = self.get_status()
@@ -222,66 +328,69 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
 
         # Activate CW mode
         if mode != 'cw':
-            self._ip_connection.write(':OUTP:STAT ON')
-            self._ip_connection.write('*WAI')
+            self._ip_connection.write(':FREQ:MODE CW')
+            self._mode = 'cw'
         # Set CW frequency
         if frequency is not None:
             self.set_frequency(frequency)
-            self._ip_connection.write('*WAI')
         # Set CW power
         if power is not None:
             self.set_power(power)
-            self._ip_connection.write('*WAI')
         # Return actually set values
+        self._ip_connection.write('*WAI')
         mode, dummy = self.get_status()
-        actual_freq = self.get_frequency()
-        actual_power = self.get_power()
+        actual_freq, actual_power = self._get_frequency_and_power()
 
         return actual_freq, actual_power, mode
 
-    def set_list(self, freq=None, power=None):
+    def set_list(self, frequency=None, power=None):
         """ Sets the MW mode to list mode
 
-        @param list freq: list of frequencies in Hz
+        @param list frequency: list of frequencies in Hz
         @param float power: MW power of the frequency list in dBm
 
-        @return int: error code (0:OK, -1:error)
+        @return float, float, str: current frequency in Hz, current power in dBm,
+                                   current mode
         """
-        error = 0
-
-        # put all frequencies into a string
-        self._ip_connection.write(':LIST:DIR UP')
-        freqstring = ' {0:f}'.format(freq[0])
-        for f in freq[:-1]:
-            freqstring += ' ,{0:f}'.format(f)
-        freqstring += ' ,{0:f}'.format(freq[-1])
-
-        freqcommand = ':LIST:FREQ' + freqstring
-
-        self._ip_connection.write(freqcommand)
-        self._ip_connection.write('*WAI;')
 
         # there are n+1 list entries for scanning n frequencies
-        # due to counter/trigger issues
-        powcommand = ':LIST:POW {0}{1};'.format(power, (' ,' + str(power)) * (len(freq)))
-        self._ip_connection.write(powcommand)
+        # due to counter/trigger issues, so the first frequency is repeated
+        n_entries = len(frequency) + 1
+        write = self._ip_connection.write
+
+        write(':LIST:DIR UP')
+        freq_entries = np.asarray(frequency, dtype=np.float64)
+        freq_entries = np.concatenate((freq_entries[:1], freq_entries))
+        if self._binary_list_transfer:
+            # definite length block of big endian float64 values
+            self._ip_connection.write_binary_values(
+                ':LIST:FREQ ', freq_entries, datatype='d', is_big_endian=True)
+        else:
+            # put all frequencies into a string
+            freqstring = ' ' + ','.join(np.char.mod('%f', freq_entries))
+            freqcommand = ':LIST:FREQ' + freqstring
+            write(freqcommand)
 
-        self._ip_connection.write('*WAI;')
-        self._ip_connection.write(':LIST:MODE:MAN')
+        # one power entry for each of the n+1 list entries
+        powcommand = ':LIST:POW ' + ','.join(['{0:f}'.format(power)] * n_entries)
+        write(powcommand)
+        write(':LIST:MODE:MAN')
 
         #create command for delaytime, apparently important because otherwise list mode won't work (bug anapico???)
-        delstring = ' {0:f}'.format(0)
-        dwellstring = ' {0:f}'.format(1)
-        for i in range(0,len(freq)):
-            delstring += ' ,{0:f}'.format(0)
-            dwellstring+= ' ,{0:f}'.format(1)
+        if n_entries not in self._del_dwell_cache:
+            self._del_dwell_cache[n_entries] = (
+                ' ' + ','.join(['{0:f}'.format(0)] * n_entries),
+                ' ' + ','.join(['{0:f}'.format(1)] * n_entries))
+        delstring, dwellstring = self._del_dwell_cache[n_entries]
         delcommand = ':LIST:DEL' + delstring
         dwellcommand = 'LIST:DWEL' + dwellstring
-        self._ip_connection.write(delcommand)
-        self._ip_connection.write(dwellcommand)
-        self._ip_connection.write(':FREQ:MODE LIST')
-        actual_freq = self.get_frequency()
-        actual_power = self.get_power()
+        write(delcommand)
+        write(dwellcommand)
+        self._write_many(':FREQ:MODE LIST', '*WAI')
+        self._mode = 'list'
+        # in list mode the device reports the list values, not the CW ones
+        self._clear_readback_cache()
+        actual_freq, actual_power = self._get_frequency_and_power()
 
         mode, dummy = self.get_status()
 
@@ -292,8 +401,7 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
 
         @return int: error code (0:OK, -1:error)
         """
-        self._ip_connection.write(':ABOR;')
-        self._ip_connection.write('*WAI;')
+        self._write_many(':ABOR', '*WAI')
         return 0
 
     def list_on(self):
@@ -311,15 +419,7 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
             else:
                 self.off()
 
-                self._ip_connection.write(':FREQ:MODE LIST')
-        self._ip_connection.write('*WAI;')
-        self._ip_connection.write(':OUTP:STAT ON')
-        self._ip_connection.write('*WAI;')
-        dummy, is_running = self.get_status()
-        while not is_running:
-            time.sleep(0.2)
-            dummy, is_running = self.get_status()
-        return 0
+        return self._switch_output('list', True)
 
     def set_ext_trigger(self, pol=TriggerEdge.RISING):
         """ Set the external trigger for this device with proper polarization.
@@ -335,14 +435,9 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
             edge = 'NEG'
         else:
             return -1
-        try:
-
-            self._ip_connection.write(':TRIG:TYPE POIN')
-            self._ip_connection.write(':TRIG:SOUR EXT;')
-            self._ip_connection.write(':TRIG:SLOP {0};'.format(edge))
-
-        except:
-            return -1
+        self._write_many(':TRIG:TYPE POIN',
+                         ':TRIG:SOUR EXT',
+                         ':TRIG:SLOP {0}'.format(edge))
         return 0
 
     def set_sweep(self, start, stop, step, power):
@@ -356,18 +451,28 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
         @param power float: output power
         @return int: number of frequency steps generated
         """
-        self._ip_connection.write(':SOUR:POW ' + str(power)+';')
-        self._ip_connection.write('*WAI')
-        self._step_points = int((stop-start-step)/step)
-        self._ip_connection.write(':SOUR:FREQ:STAR ' + str(start-step)+';')
-        self._ip_connection.write(':SOUR:FREQ:STOP ' + str(stop)+';')
-        self._ip_connection.write(':SOUR:SWE:POIN' + str(self._step_points)+';')
-        self._ip_connection.write(':SOUR:SWE:SPAC LIN;')
-        self._ip_connection.write(':TRIG:SOUR BUS;')
-        self._ip_connection.write('*WAI;')
-        n = int(np.round(float(self._ip_connection.query(':SWE:FREQ:POIN?;'))))
-        if n != len(self._mw_frequency_list):
-             return -1
+        # the sweep starts one step early, like the extra entry in list mode
+        sweep_start = start - step
+        n_steps = int(round((stop - sweep_start) / step))
+        if abs(n_steps * step - (stop - sweep_start)) > step * 1e-6:
+            self.log.warning('Anapico sweep range is not a multiple of the step '
+                             'size, the stop frequency will not be reached exactly.')
+        self._step_points = n_steps + 1
+        self._write_many(':SOUR:POW ' + str(power),
+                         ':SOUR:FREQ:STAR ' + str(sweep_start),
+                         ':SOUR:FREQ:STOP ' + str(stop),
+                         ':SOUR:SWE:POIN ' + str(self._step_points),
+                         ':SOUR:SWE:SPAC LIN',
+                         ':TRIG:SOUR BUS',
+                         '*WAI')
+        # the sweep changes power and frequency readback
+        self._clear_readback_cache()
+        # the device clamps the number of points, so check what it accepted
+        n = int(round(float(self._ip_connection.query(':SWE:FREQ:POIN?'))))
+        if n != self._step_points:
+            self.log.error('Anapico accepted {0} sweep points instead of {1}.'
+                           ''.format(n, self._step_points))
+            return -1
         return n - 1
 
     def reset_sweeppos(self):
@@ -375,7 +480,7 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
 
         @return int: error code (0:OK, -1:error)
         """
-        self._ip_connection.write(':ABOR;')
+        self._ip_connection.write(':ABOR')
         return 0
 
     def sweep_on(self):
@@ -383,5 +488,5 @@ class MicrowaveAnapico(Base, MicrowaveInterface):
 
         @return int: error code ( 0:ok, -1:error)
         """
-        self._ip_connection.write('*TRG;')
+        self._ip_connection.write('*TRG')
         return 0
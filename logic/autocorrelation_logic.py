@@ -20,10 +20,8 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 """
 
 import datetime
-import time
 from collections import OrderedDict
 
-import matplotlib.pyplot as plt
 import numpy as np
 from qtpy import QtCore
 
@@ -39,6 +37,9 @@ class AutocorrelationLogic(GenericLogic):
     _modclass = 'AutocorrelationLogic'
     _modtype = 'logic'
 
+    # the qudi matplotlib style only has to be applied once
+    _mpl_style_applied = False
+
     # declare connectors
     #_connectors = {
       #  'autocorrelator': 'AutocorrelationInterface',
@@ -52,6 +53,7 @@ class AutocorrelationLogic(GenericLogic):
 
     sigCorrelationStatusChanged = QtCore.Signal(bool)
     sigCorrelationDataNext = QtCore.Signal()
+    # carries no payload, the data is read with get_snapshot()
     sigCorrelationUpdated = QtCore.Signal()
 
 
@@ -77,6 +79,13 @@ class AutocorrelationLogic(GenericLogic):
         self._bin_width = 500
         self._refresh_time = 1000 #in ms
         self._saving = False
+        self._delay_axis = None
+        self._fig = None
+        self._canvas = None
+        self._ax = None
+        self._line = None
+        # (bin_width, count_length) last sent to the hardware
+        self._last_config = None
 
     def on_activate(self):
         """ Initialisation performed during activation of the module.
@@ -84,6 +93,9 @@ class AutocorrelationLogic(GenericLogic):
 
         self._correlation_device = self.get_connector('autocorrelator')
         self._save_logic = self.get_connector('savelogic')
+        # hardware calls made on every tick of the loop
+        self._get_trace = self._correlation_device.get_data_trace
+        self._stop_measure = self._correlation_device.stop_measure
 
         # Recall saved app-parameters
         if 'count_length' in self._statusVariables:
@@ -92,21 +104,40 @@ class AutocorrelationLogic(GenericLogic):
             self._bin_width = self._statusVariables['bin_width']
         if 'saving' in self._statusVariables:
             self._saving = self._statusVariables['saving']
+        self._update_axis_params()
 
-        self.rawdata = np.zeros([self._correlation_device.get_count_length()])
+        self.rawdata = np.zeros([self._correlation_device.get_count_length()], dtype=np.int32)
 
         self.sigCorrelationDataNext.connect(self.correlation_loop_body, QtCore.Qt.QueuedConnection)
 
+        # delay timer for the next refresh, lives in the logic thread
+        self._refresh_timer = QtCore.QTimer()
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.timeout.connect(self.sigCorrelationDataNext.emit)
+
+        # GUI updates are throttled to about 30 Hz independent of the refresh time
+        self._dirty = False
+        self._update_timer = QtCore.QTimer()
+        self._update_timer.setInterval(33)
+        self._update_timer.timeout.connect(self._emit_if_dirty)
+
         self._plot_x = np.array(np.zeros(self._count_length),dtype='int32')
         self._plot_y = np.array(np.zeros(self._count_length),dtype='int32')
         self.stopRequested = False
         self.continueRequested = False
+        self.restartRequested = False
 
     def on_deactivate(self):
         """ Reverse steps of activation
 
         @return int: error code (0:OK, -1:error)
         """
+        self._refresh_timer.stop()
+        self._refresh_timer.timeout.disconnect()
+        self._update_timer.stop()
+        self._update_timer.timeout.disconnect()
+        # the hardware may be reset before the next activation
+        self._last_config = None
         # Save parameters to disk
         self._statusVariables['count_length'] = self._count_length
         self._statusVariables['bin_width'] = self._bin_width
@@ -129,11 +160,12 @@ class AutocorrelationLogic(GenericLogic):
             restart = False
 
         if count_length > 0:
-            self.stop_correlation()
             self._count_length = int(count_length)
-            # if the counter was running, restart it
+            self._update_axis_params()
+            # an idle correlator is reconfigured on the next start, a running one
+            # is restarted by the loop once it has stopped
             if restart:
-                self.start_correlation()
+                self._request_restart()
         else:
             self.log.warning('count_length has to be larger than 0! Command ignored!')
         self.sigCountLengthChanged.emit(self._count_length)
@@ -157,11 +189,12 @@ class AutocorrelationLogic(GenericLogic):
             restart = False
 
         if constraints.min_bin_width <= bin_width:
-            self.stop_correlation()
             self._bin_width = bin_width
-            # if the counter was running, restart it
+            self._update_axis_params()
+            # an idle correlator is reconfigured on the next start, a running one
+            # is restarted by the loop once it has stopped
             if restart:
-                self.start_correlation()
+                self._request_restart()
         else:
             self.log.warning('bin_width too small! Command ignored!')
         self.sigCountingBinWidthChanged.emit(self._bin_width)
@@ -170,13 +203,8 @@ class AutocorrelationLogic(GenericLogic):
 
     def set_refresh_time(self, refresh_time = 500):
 
-        if self.module_state() == 'locked':
-            restart = True
-        else:
-            restart = False
-
-        if restart:
-            self.start_correlation()
+        # the loop reads the refresh time on every tick, a running measurement
+        # does not have to be restarted
         self._refresh_time = refresh_time
         self.sigCountingRefreshTimeChanged.emit(self._refresh_time)
 
@@ -199,6 +227,30 @@ class AutocorrelationLogic(GenericLogic):
         """
         return self._bin_width
 
+    def get_axis_params(self):
+        """ Returns the parameters of the delay axis in one call.
+
+        @return tuple(float, float, int): half span in s, bin width in s and
+                                          number of bins
+        """
+        return self._axis_params
+
+    def _update_axis_params(self):
+        """ Recalculate the cached delay axis parameters.
+        """
+        step = self._bin_width / 1e12
+        self._axis_params = ((self._count_length / 2) * step, step, self._count_length)
+        # rebuilt on the next configuration or save
+        self._delay_axis = None
+
+    def _build_delay_axis(self):
+        """ Calculate the delay axis for the saved data, one value per bin.
+        """
+        # an arange with float step may be off by one
+        count_length = self._count_length
+        self._delay_axis = ((np.arange(count_length, dtype=np.float64) - count_length / 2)
+                            * (self._bin_width * 1e-12))
+
     def get_refresh_time(self):
 
 
@@ -206,7 +258,8 @@ class AutocorrelationLogic(GenericLogic):
 
     def start_correlation(self):
         correlation_status = self._configure_correlation()
-        self._correlation_device.start_measure()
+        if correlation_status >= 0:
+            self._correlation_device.start_measure()
         with self.threadlock:
             #Lock module
             self.module_state.lock()
@@ -217,19 +270,37 @@ class AutocorrelationLogic(GenericLogic):
                 self.sigCorrelationStatusChanged.emit(False)
                 return -1
 
-            self.rawdata = np.zeros((self.get_count_length(),), dtype='int32')
+            self._reset_rawdata((self.get_count_length(),))
             self.sigCorrelationStatusChanged.emit(True)
+            self._update_timer.start()
             self.sigCorrelationDataNext.emit()
             return
 
 
     def stop_correlation(self):
         """ Set a flag to request stopping counting.
+
+        The loop body is queued right away so the stop does not wait for the refresh timer.
+        """
+        # an explicit stop overrides a restart requested by the setters
+        self._request_stop(restart=False)
+        return
+
+    def _request_restart(self):
+        """ Stop a running measurement and let the loop start it again with the new settings.
+        """
+        self._request_stop(restart=True)
+
+    def _request_stop(self, restart):
+        """ Set the stop flags together, before the loop body can pick them up.
+
+        @param bool restart: start the measurement again once it has stopped
         """
         if self.module_state() == 'locked':
             with self.threadlock:
                 self.stopRequested = True
-        return
+                self.restartRequested = restart
+            self.sigCorrelationDataNext.emit()
 
     def continue_correlation(self):
 
@@ -237,6 +308,7 @@ class AutocorrelationLogic(GenericLogic):
             self._correlation_device.continue_measure()
             with self.threadlock:
                 self.module_state.lock()
+                self._update_timer.start()
                 self.sigCorrelationDataNext.emit()
         return
 
@@ -245,20 +317,77 @@ class AutocorrelationLogic(GenericLogic):
 
         if self.module_state() == 'locked':
             with self.threadlock:
-                if self.stopRequested:
-                    self._correlation_device.stop_measure()
+                stop = self.stopRequested
+                if stop:
+                    # drop a pending refresh so it cannot run into a restarted measurement
+                    self._refresh_timer.stop()
+                    self._update_timer.stop()
+                    self._stop_measure()
                     self.stopRequested = False
                     self.module_state.unlock()
+                    self._dirty = False
                     self.sigCorrelationUpdated.emit()
-                    return
-                time.sleep(self._refresh_time/1000) #sleep in seconds
-                self.rawdata = self._correlation_device.get_data_trace()
-                self.sigCorrelationUpdated.emit()
-                self.sigCorrelationDataNext.emit()
+                    restart = self.restartRequested
+                    self.restartRequested = False
+            if stop:
+                # start outside threadlock, start_correlation takes it itself
+                if restart:
+                    self.start_correlation()
+                return
+            # refill the buffer from start_correlation, casting straight into its dtype
+            trace = np.asarray(self._get_trace())
+            # save_data copies rawdata under the same lock
+            with self.threadlock:
+                self._reset_rawdata(np.shape(trace), clear=False)
+                np.copyto(self.rawdata, trace, casting='unsafe')
+            self._dirty = True
+            # wait for the next refresh in the event loop instead of sleeping
+            self._refresh_timer.start(self._refresh_time)
         return
 
+    def _emit_if_dirty(self):
+        """ Notify listeners only if the data changed since the last notification.
+        """
+        if self._dirty:
+            self._dirty = False
+            self.sigCorrelationUpdated.emit()
+
+    def get_snapshot(self):
+        """ Returns a copy of the latest correlation trace.
+
+        The measurement loop keeps writing into rawdata, so callers get their own
+        array that does not change underneath them.
+
+        @return numpy.ndarray: copy of rawdata
+        """
+        with self.threadlock:
+            return self.rawdata.copy()
+
+    def _reset_rawdata(self, shape, clear=True):
+        """ Keep rawdata in the same buffer and only reallocate it if the shape changed.
+
+        @param tuple shape: required shape of the buffer
+        @param bool clear: set the buffer to zero if it is reused
+        """
+        if self.rawdata.shape != tuple(shape):
+            self.rawdata = np.zeros(shape, dtype=np.int32)
+        elif clear:
+            self.rawdata.fill(0)
+
     def _configure_correlation(self):
-        self._correlation_device.configure(self._bin_width, self._count_length)
+        # the setters drop the axis, rebuild it here instead of on every save
+        if self._delay_axis is None:
+            self._build_delay_axis()
+        # reprogramming the hardware is slow, skip it if nothing changed
+        config = (self._bin_width, self._count_length)
+        if config == self._last_config:
+            return 0
+        # the hardware returns -1 on failure, the dummy returns nothing
+        if self._correlation_device.configure(*config) == -1:
+            self._last_config = None
+            self.log.error('Configuring the autocorrelation hardware failed.')
+            return -1
+        self._last_config = config
 
         return 0
 
@@ -294,10 +423,10 @@ class AutocorrelationLogic(GenericLogic):
         parameters['Bin width'] = self._bin_width
 
         data = OrderedDict()
-        data['delay (ps)'] = np.arange(-1 * ((self.get_count_length() / 2) * self.get_bin_width() / (1e12)),
-                         (self.get_count_length()/2)*self.get_bin_width()/(1e12),
-                          self.get_bin_width()/(1e12))
-        data['counts'] = self.rawdata
+        if self._delay_axis is None:
+            self._build_delay_axis()
+        data['delay (ps)'] = self._delay_axis
+        data['counts'] = self.get_snapshot()
         fig = self.draw_figure(data)
         self._save_logic.save_data(data,
                                    filepath=filepath,
@@ -317,16 +446,33 @@ class AutocorrelationLogic(GenericLogic):
         @return: fig fig: a matplotlib figure object to be saved to file.
         """
 
+        # matplotlib is only needed for saving, import it on first use
+        import matplotlib.style
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
         count_data = data['counts']
         time_data = data['delay (ps)']
         time_data = time_data*1e9
 
         # Use qudi style
-        plt.style.use(self._save_logic.mpl_qd_style)
-
-        fig, ax = plt.subplots()
-        ax.plot(time_data, count_data, linestyle=':',linewidth=0.5)
-        ax.set_xlabel('Delay $\\tau$ (ns)')
-        ax.set_ylabel('Counts')
+        if not AutocorrelationLogic._mpl_style_applied:
+            matplotlib.style.use(self._save_logic.mpl_qd_style)
+            AutocorrelationLogic._mpl_style_applied = True
+
+        # the figure is reused for every save and rendered by Agg only, without
+        # going through pyplot and the GUI backend
+        if self._fig is None:
+            self._fig = Figure()
+            self._canvas = FigureCanvasAgg(self._fig)
+            self._ax = self._fig.add_subplot(111)
+            self._line, = self._ax.plot(time_data, count_data, linestyle=':',linewidth=0.5)
+            self._ax.set_xlabel('Delay $\\tau$ (ns)')
+            self._ax.set_ylabel('Counts')
+        else:
+            # only swap the data of the existing line
+            self._line.set_data(time_data, count_data)
+            self._ax.relim()
+            self._ax.autoscale_view()
 
-        return fig
\ No newline at end of file
+        return self._fig
\ No newline at end of file